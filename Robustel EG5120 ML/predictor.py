@@ -3,9 +3,12 @@ import os
 # 0 = All logs, 1 = Filter INFO, 2 = Filter INFO/WARNING, 3 = Filter all
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
+import functools
 import json
+import operator
 import sys
 import numpy as np
+import orjson
 from ai_edge_litert.interpreter import Interpreter
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,23 +18,37 @@ MODEL_PATH = os.path.join(SCRIPT_DIR, "weather_model.tflite")
 PA_THRESHOLD = 2000.0
 TOPK = 5
 
+# Leave one core free for Node-RED. XNNPACK is LiteRT's default CPU delegate,
+# so the thread count is the only knob needed here.
+NUM_THREADS = max(1, (os.cpu_count() or 1) - 1)
 
+
+@functools.lru_cache(maxsize=None)
 def load_preprocess(path: str):
+    """
+    Returns (features, mean, inv_std, labels). mean and inv_std are C-contiguous
+    float32 rows shaped (1, N) like the model input. The reciprocal of std is
+    precomputed so the hot path multiplies instead of divides.
+    """
     with open(path, "r", encoding="utf-8") as f:
         pp = json.load(f)
 
-    features = pp.get("features", ["temperature", "humidity", "pressure"])
+    features = pp["features"]
+    labels = pp["labels"]
     scaler = pp["scaler"]
+
     mean = np.array(scaler["mean"], dtype=np.float32)
     std = np.array(scaler["std"], dtype=np.float32)
-    labels = pp["labels"]
 
     if len(features) != len(mean) or len(features) != len(std):
         raise ValueError(
             f"Preprocess mismatch: features={len(features)}, mean={len(mean)}, std={len(std)}"
         )
 
-    return features, mean, std, labels
+    mean = np.ascontiguousarray(mean).reshape(1, -1)
+    inv_std = np.ascontiguousarray(1.0 / std, dtype=np.float32).reshape(1, -1)
+
+    return features, mean, inv_std, labels
 
 
 def normalize_units(payload: dict):
@@ -42,13 +59,16 @@ def normalize_units(payload: dict):
     return payload
 
 
-def build_input_vector(payload: dict, features: list):
-    x = []
-    for f in features:
-        if f not in payload or payload[f] is None:
-            raise ValueError(f"Missing or null feature: {f}")
-        x.append(float(payload[f]))
-    return np.array(x, dtype=np.float32)
+def build_input_vector(payload: dict):
+    try:
+        vals = _getter(payload)
+    except KeyError as e:
+        raise ValueError(f"Missing or null feature: {e.args[0]}") from None
+    if _nf == 1:
+        vals = (vals,)
+    if None in vals:
+        raise ValueError(f"Missing or null feature: {_features[vals.index(None)]}")
+    return np.fromiter(vals, dtype=np.float32, count=_nf)
 
 
 def read_payload_json():
@@ -62,41 +82,130 @@ def read_payload_json():
     return sys.argv[1]
 
 
-def main():
-    if not os.path.exists(PREPROCESS_PATH):
-        raise FileNotFoundError(f"preprocess.json not found at: {PREPROCESS_PATH}")
+_interpreter = None
+_input_tensor = None
+_output_tensor = None
+_input_quant = None
+_output_quant = None
+_in_scale = None
+_in_offset = None
+_scratch = None
+_features = None
+_getter = None
+_nf = 0
+_labels = None
 
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"weather_model.tflite not found at: {MODEL_PATH}")
 
-    features, mean, std, labels = load_preprocess(PREPROCESS_PATH)
+def init():
+    """
+    Load preprocess.json and the TFLite model once, allocate tensors and
+    cache everything predict() needs for the lifetime of the process.
+    """
+    global _interpreter, _input_tensor, _output_tensor, _input_quant, _output_quant
+    global _in_scale, _in_offset, _scratch, _features, _getter, _nf, _labels
 
-    interpreter = Interpreter(model_path=MODEL_PATH)
-    interpreter.allocate_tensors() 
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
+    try:
+        _features, mean, inv_std, _labels = load_preprocess(PREPROCESS_PATH)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"preprocess.json not found at: {PREPROCESS_PATH}") from None
+    _getter = operator.itemgetter(*_features)
+    _nf = len(_features)
 
-    raw = read_payload_json()
-    payload = json.loads(raw)
+    try:
+        _interpreter = Interpreter(
+            model_path=MODEL_PATH,
+            num_threads=NUM_THREADS,
+        )
+    except ValueError:
+        # The runtime reports any load failure as ValueError; only stat on that path
+        if not os.path.isfile(MODEL_PATH):
+            raise FileNotFoundError(f"weather_model.tflite not found at: {MODEL_PATH}") from None
+        raise
+    _interpreter.allocate_tensors()
+    input_details = _interpreter.get_input_details()[0]
+    output_details = _interpreter.get_output_details()[0]
+
+    # Callables returning numpy views onto the interpreter arena. Only the
+    # callables are kept: invoke() refuses to run while a view is alive.
+    _input_tensor = _interpreter.tensor(input_details["index"])
+    _output_tensor = _interpreter.tensor(output_details["index"])
+
+    # (scale, zero_point) for INT8 models, None for float models
+    _input_quant = input_details["quantization"] if input_details["dtype"] == np.int8 else None
+    _output_quant = output_details["quantization"] if output_details["dtype"] == np.int8 else None
+
+    # Fold standardization, and for int8 models input quantization, into one
+    # affine map: x * _in_scale + _in_offset
+    _in_scale = inv_std
+    _in_offset = -mean * inv_std
+    if _input_quant is not None:
+        scale, zp = _input_quant
+        _in_scale = _in_scale / scale
+        _in_offset = _in_offset / scale + zp
+    _scratch = np.empty((1, _nf), dtype=np.float32)
+
+
+def predict(payload: dict) -> dict:
     payload = normalize_units(payload)
 
-    x = build_input_vector(payload, features)
-    x = (x - mean) / std
-    x = x.reshape(1, -1)
+    x = build_input_vector(payload)
+
+    if _input_quant is None:
+        np.multiply(x, _in_scale, out=_scratch)
+        np.add(_scratch, _in_offset, out=_input_tensor())
+    else:
+        np.multiply(x, _in_scale, out=_scratch)
+        np.add(_scratch, _in_offset, out=_scratch)
+        np.rint(_scratch, out=_scratch)
+        np.clip(_scratch, -128, 127, out=_scratch)
+        _input_tensor()[...] = _scratch
+    _interpreter.invoke()
+
+    # Dequantization is monotonic, so argmax runs on the raw scores and
+    # only the winning score is converted
+    raw = _output_tensor()[0]
+    idx = int(raw.argmax())
+    if _output_quant is not None:
+        scale, zp = _output_quant
+        conf = float((int(raw[idx]) - zp) * scale)
+    else:
+        conf = float(raw[idx])
+
+    return {
+        "prediction": _labels[idx],
+        "confidence": conf
+    }
 
-    interpreter.set_tensor(input_details[0]["index"], x)
-    interpreter.invoke()
 
-    probs = interpreter.get_tensor(output_details[0]["index"])[0].astype(np.float64)
-    idx = int(np.argmax(probs))
-    conf = float(probs[idx])
+def write_result(result: dict):
+    out = sys.stdout.buffer
+    out.write(orjson.dumps(result))
+    out.write(b"\n")
+    out.flush()
 
-    result = {
-        "prediction": labels[idx],
-        "confidence": conf
-    }
 
-    print(json.dumps(result))
+def main():
+    """
+    One-shot mode: predict the payload passed as argument (Node-RED exec node).
+    Worker mode: without an argument, keep the model loaded and answer one
+    JSON payload per stdin line with one JSON result per stdout line.
+    """
+    init()
+
+    if len(sys.argv) >= 2:
+        write_result(predict(orjson.loads(read_payload_json())))
+        return
+
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        try:
+            write_result(predict(orjson.loads(line)))
+        except Exception as e:
+            # Still answer on stdout so results stay one-per-line with the input
+            error = {"error": str(e), "type": type(e).__name__}
+            write_result(error)
+            print(json.dumps(error), file=sys.stderr, flush=True)
 
 
 if __name__ == "__main__":
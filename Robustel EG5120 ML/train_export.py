@@ -2,6 +2,7 @@ import json
 import numpy as np
 import pandas as pd
 import tensorflow as tf
+from ai_edge_litert.interpreter import Interpreter
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import classification_report
@@ -13,6 +14,28 @@ FEATURES = ["temperature", "humidity", "pressure"]
 LABEL_COL = "Weather"
 MIN_SAMPLES = 10
 dropout = 0.3
+HIDDEN_UNITS = 16
+# "int8": full-integer model, "float16": fp16 weights with float32 I/O
+QUANTIZATION = "int8"
+
+def evaluate_tflite(tflite_model: bytes, X: np.ndarray) -> np.ndarray:
+    """Run the converted model over standardized rows and return class indices"""
+    # Same runtime as predictor.py; tf.lite.Interpreter is deprecated
+    interpreter = Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    inp = interpreter.get_input_details()[0]
+    out = interpreter.get_output_details()[0]
+
+    if inp["dtype"] == np.int8:
+        scale, zp = inp["quantization"]
+        X = np.clip(np.rint(X / scale + zp), -128, 127).astype(np.int8)
+
+    preds = np.empty(len(X), dtype=np.int64)
+    for i, row in enumerate(X):
+        interpreter.set_tensor(inp["index"], row.reshape(1, -1))
+        interpreter.invoke()
+        preds[i] = interpreter.get_tensor(out["index"])[0].argmax()
+    return preds
 
 def main():
     df = pd.read_csv("WeatherData.csv")
@@ -27,6 +50,9 @@ def main():
     le = LabelEncoder()
     y = le.fit_transform(df[LABEL_COL].values)
 
+    # Standardize outside the graph: with INT8 inputs every feature shares one
+    # input scale, so raw pressure (std ~0.84 kPa) would collapse to a handful
+    # of quantization steps. predictor.py applies the same scaler on-device.
     scaler = StandardScaler()
     Xs = scaler.fit_transform(X).astype(np.float32)
 
@@ -39,9 +65,8 @@ def main():
     print(f"Classes: {le.classes_} \n")
     model = tf.keras.Sequential([
         tf.keras.layers.Input(shape=(len(FEATURES),)),
-        tf.keras.layers.Dense(64, activation="relu"),
+        tf.keras.layers.Dense(HIDDEN_UNITS, activation="relu"),
         tf.keras.layers.Dropout(dropout),
-        tf.keras.layers.Dense(32, activation="relu"),
         tf.keras.layers.Dense(n_classes, activation="softmax"),
     ])
     print("\n============ Step 2: training step ==============\n")
@@ -103,12 +128,36 @@ def main():
     # Export TFLite
         
     converter = tf.lite.TFLiteConverter.from_keras_model(model)
-    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if QUANTIZATION == "float16":
+        # No calibration needed; predictor.py sees float32 inputs/outputs
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        # Full-integer INT8 quantization, calibrated on training samples
+        def rep_data():
+            for row in X_train[:200]:
+                yield [row.reshape(1, -1).astype(np.float32)]
+
+        converter.representative_dataset = rep_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
     tflite_model = converter.convert()
 
+    # Check the converted model, not just the float Keras one: quantization
+    # loss only shows up here
+    tflite_preds = evaluate_tflite(tflite_model, X_test)
+    print(f"\nTFLite ({QUANTIZATION}) classification report:\n")
+    print(classification_report(
+        y_test, tflite_preds, labels=np.arange(n_classes),
+        target_names=le.classes_, zero_division=0,
+    ))
+
     with open("weather_model.tflite", "wb") as f:
         f.write(tflite_model)
-    print("Saved: weather_model.tflite")
+    print(f"Saved: weather_model.tflite ({QUANTIZATION})")
 
     # Export preprocess.json (edge friendly)
     preprocess = {
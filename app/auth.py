@@ -1,48 +1,96 @@
-from datetime import datetime, timedelta
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+from datetime import datetime, timedelta, timezone
+import hashlib
+import hmac
+import threading
+import time
+import bcrypt
+import jwt
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES
 
-SECRET_KEY = "12345667890abcdef1234567890abcdef1234567890abcdef1234567890abcdef1234"  # Use a secure random key in production
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt only looks at the first 72 bytes; bcrypt>=5 raises ValueError beyond it
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+_SECRET_BYTES = SECRET_KEY.encode()
+
+# Recent bcrypt results, keyed by an HMAC of (password, hash) so no
+# plaintext is held in memory. A changed password changes the hash, and
+# with it the key.
+_verify_cache = TTLCache(maxsize=2048, ttl=60)
+_verify_cache_lock = threading.Lock()  # login runs in the threadpool
+
+# Verified tokens -> (username, exp), keyed by a digest of the token.
+# Only touched from the event loop, so no lock is needed.
+_token_cache = TTLCache(maxsize=10_000, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 def hash_password(password: str) -> str:
     """Hash a password for storing"""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+def _verify_cache_key(plain_password: str, hashed_password: str) -> bytes:
+    return hmac.new(
+        _SECRET_BYTES, plain_password.encode() + hashed_password.encode(), hashlib.sha256
+    ).digest()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a stored password against one provided by user"""
-    return pwd_context.verify(plain_password, hashed_password)
+    # Registration never accepts longer passwords, so this can only be a miss
+    if len(plain_password.encode()) > BCRYPT_MAX_PASSWORD_BYTES:
+        return False
+    key = _verify_cache_key(plain_password, hashed_password)
+    with _verify_cache_lock:
+        result = _verify_cache.get(key)
+    if result is None:
+        result = bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+        with _verify_cache_lock:
+            _verify_cache[key] = result
+    return result
 
 def create_access_token(data: dict) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SECRET_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
     """
     Dependency to get the current user from the JWT token.
     Returns the username if valid, raises 401 if invalid.
+    Declared async: decoding is a short CPU-only step, so it runs on the
+    event loop instead of taking a threadpool slot per request.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_cache.get(key)
+    if cached is not None:
+        username, exp = cached
+        if exp > time.time():
+            return username
+        _token_cache.pop(key, None)
+        raise credentials_exception
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
+        # A validly signed token without exp/sub fails here as a 401 instead
+        # of surfacing later as a KeyError
+        payload = jwt.decode(
+            token, _SECRET_BYTES, algorithms=[ALGORITHM],
+            options={"require": ["exp", "sub"]},
+        )
+        username: str = payload["sub"]
+        _token_cache[key] = (username, payload["exp"])
         return username
-    except JWTError:
+    except jwt.PyJWTError:
         raise credentials_exception
\ No newline at end of file
@@ -3,6 +3,23 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Malformed numeric settings, reported by validate_config() at startup. The
+# defaults stand in until then so importing a module never fails on them.
+_invalid: list[str] = []
+
+def _positive_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        value = 0
+    if value < 1:
+        _invalid.append(f"{name}={raw!r}")
+        return default
+    return value
+
 INFLUXDB_URL = os.getenv("INFLUXDB_URL", "")
 INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN", "")
 INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "")
@@ -10,6 +27,13 @@ INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "")
 INFLUXDB_Measurement = os.getenv("INFLUXDB_Measurement", "")
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+GROQ_CONCURRENCY = _positive_int_env("GROQ_CONCURRENCY", 16)
+
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+ACCESS_TOKEN_EXPIRE_MINUTES = _positive_int_env("ACCESS_TOKEN_EXPIRE_MINUTES", 60)
+
+# HS256 keys shorter than the 32-byte digest are brute-forceable
+SECRET_KEY_MIN_BYTES = 32
 
 def validate_config() -> None:
     missing = [k for k, v in {
@@ -19,6 +43,11 @@ def validate_config() -> None:
         "INFLUXDB_BUCKET": INFLUXDB_BUCKET,
         "INFLUXDB_Measurement": INFLUXDB_Measurement,
         "GROQ_API_KEY": GROQ_API_KEY,
+        "SECRET_KEY": SECRET_KEY,
     }.items() if not v]
     if missing:
         raise RuntimeError(f"Missing environment variables: {', '.join(missing)}")
+    if len(SECRET_KEY.encode()) < SECRET_KEY_MIN_BYTES:
+        raise RuntimeError(f"SECRET_KEY must be at least {SECRET_KEY_MIN_BYTES} bytes")
+    if _invalid:
+        raise RuntimeError(f"Invalid environment variables (expected a positive integer): {', '.join(_invalid)}")
@@ -2,7 +2,7 @@ from sqlmodel import SQLModel, create_engine, Session
 
 DATABASE_URL = "sqlite:///./users.db"
 
-engine = create_engine(DATABASE_URL, echo=True,connect_args={"check_same_thread": False})
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
 def create_db():
     from app.models import User
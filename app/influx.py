@@ -1,7 +1,5 @@
 from influxdb_client import InfluxDBClient
-from app.config import INFLUXDB_URL, INFLUXDB_TOKEN, INFLUXDB_ORG, validate_config
-
-validate_config()
+from app.config import INFLUXDB_URL, INFLUXDB_TOKEN, INFLUXDB_ORG
 
 _client: InfluxDBClient | None = None
 
@@ -1,29 +1,30 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from app.routes.weather import router as weather_router
-from app.routes.rag import router as rag_router
+from app.routes.rag import router as rag_router, groq_client
 from app.routes.auth import router as auth_router 
 from app.database import create_db               
 import os
 import google.generativeai as genai
-from app.config import GROQ_API_KEY
+from app.config import GROQ_API_KEY, validate_config
 
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    validate_config()
     create_db()
     # Startup: Initialize Gemini client or DB connections here
     if GROQ_API_KEY:
         genai.configure(api_key=GROQ_API_KEY)
     yield
     # Shutdown: Clean up resources
+    await groq_client.close()
 
-# 2. Use ORJSONResponse for faster JSON serialization
 app = FastAPI(docs_url="/", redoc_url=None,
-              title="IoT Weather API", version="1.0.0")
+              title="IoT Weather API", version="1.0.0",
+              lifespan=lifespan)
 
 # 3. Secure CORS: Dynamic origins from environment variables
 # Avoid "*" in production; explicitly list trusted domains
@@ -1,17 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from app.database import get_session
 from app.models import User
-from app.auth import hash_password, verify_password, create_access_token
+from app.auth import hash_password, verify_password, create_access_token, BCRYPT_MAX_PASSWORD_BYTES
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 # Request model for registration - receives JSON body
 class RegisterRequest(BaseModel):
     username: str = Field(..., min_length=3, description="Username (minimum 3 characters)")
-    password: str = Field(..., min_length=6, description="Password (minimum 6 characters)")
+    password: str = Field(..., min_length=6, description="Password (minimum 6 characters, at most 72 bytes)")
+
+    @field_validator("password")
+    @classmethod
+    def password_fits_bcrypt(cls, v: str) -> str:
+        if len(v.encode()) > BCRYPT_MAX_PASSWORD_BYTES:
+            raise ValueError(f"Password must be at most {BCRYPT_MAX_PASSWORD_BYTES} bytes")
+        return v
 
 # Response models
 class MessageResponse(BaseModel):
@@ -21,31 +29,34 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str
 
+# Constant response, built once
+USER_CREATED = MessageResponse(message="User created successfully")
+
 @router.post("/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 def register(req: RegisterRequest, db: Session = Depends(get_session)):
     """
     Register a new user account.
     
     - **username**: Unique username (min 3 characters)
-    - **password**: Password (min 6 characters) - will be hashed before storage
+    - **password**: Password (min 6 characters, max 72 bytes) - will be hashed before storage
     """
-    # Check if username already exists
-    existing_user = db.exec(select(User).where(User.username == req.username)).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already exists"
-        )
-    
-    # Create new user with hashed password
+    # Create new user with hashed password; the unique index on username
+    # rejects duplicates, so no separate existence query is needed
     new_user = User(
         username=req.username,
         hashed_password=hash_password(req.password)
     )
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already exists"
+        )
     
-    return {"message": "User created successfully"}
+    return USER_CREATED
 
 @router.post("/login", response_model=TokenResponse)
 def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_session)):
@@ -68,7 +79,5 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
     # Generate JWT token
     access_token = create_access_token({"sub": user.username})
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer"
-    }
\ No newline at end of file
+    # Server-built values: skip re-validation
+    return TokenResponse.model_construct(access_token=access_token, token_type="bearer")
\ No newline at end of file
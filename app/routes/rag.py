@@ -1,15 +1,33 @@
 # routes/rag.py - Groq version with multi-language support, full sensor data, and weather prediction
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from groq import Groq
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+import httpx
+import asyncio
+import hashlib
+import logging
+import orjson
 import os
-import json
-import traceback
-from typing import Dict, Any
+from typing import IO, Dict, Any
+from cachetools import LRUCache
+from app.config import GROQ_API_KEY, GROQ_CONCURRENCY
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Initialize Groq client
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Initialize Groq client on one shared pool. HTTP/2 multiplexes concurrent
+# /chat calls over a few connections instead of a TLS handshake each.
+# DefaultAsyncHttpxClient keeps the SDK's own timeout and redirect defaults.
+groq_client = AsyncGroq(
+    api_key=GROQ_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        http2=True,
+    ),
+)
+
+# Bound in-flight Groq calls per process so a burst queues here instead of
+# tripping upstream rate limits for every request at once
+_GROQ_SEM = asyncio.Semaphore(GROQ_CONCURRENCY)
 
 SUPPORTED_AUDIO_MIMES = {
     "audio/wav": "wav",
@@ -107,105 +125,136 @@ METRICHE SENSORI DISPONIBILI:
     }
 }
 
+# Each template split once around its two placeholders into (pre, mid, post),
+# so rendering is a plain join instead of a str.format parse
+PROMPT_PARTS = {}
+for _lang, _prompts in SYSTEM_PROMPTS.items():
+    _pre, _rest = _prompts["system_template"].split("{context}", 1)
+    _mid, _post = _rest.split("{weather_context}", 1)
+    PROMPT_PARTS[_lang] = (_pre, _mid, _post)
+
+# Localized user-facing messages for the /chat handler
+_ERRS = {
+    "en": {
+        "empty_query": "Please provide either a text query or an audio recording.",
+        "audio_empty": "Audio file is empty.",
+        "audio_too_large": "Audio file too large (max 25MB). Please record a shorter message.",
+        "transcribe_failed": "Unable to transcribe audio",
+        "not_understood": "I couldn't understand the audio. Could you please try again or type your question?",
+        "server_error": "Server error: ",
+    },
+    "it": {
+        "empty_query": "Si prega di fornire una query di testo o una registrazione audio.",
+        "audio_empty": "Il file audio è vuoto.",
+        "audio_too_large": "File audio troppo grande (max 25MB). Si prega di registrare un messaggio più breve.",
+        "transcribe_failed": "Impossibile trascrivere l'audio",
+        "not_understood": "Non ho capito l'audio. Potresti riprovare o scrivere la tua domanda?",
+        "server_error": "Errore del server: ",
+    },
+}
+
 def _normalize_audio_mime(mime: str | None) -> str:
     """Normalize MIME type to extension"""
     if not mime:
         return "wav"
-    mime = mime.strip().lower()
-    return SUPPORTED_AUDIO_MIMES.get(mime, "wav")
+    # Browsers almost always send a canonical type; only normalize on a miss
+    ext = SUPPORTED_AUDIO_MIMES.get(mime)
+    if ext:
+        return ext
+    return SUPPORTED_AUDIO_MIMES.get(mime.strip().lower(), "wav")
+
+# Returned by _parse_device_data when the form field is not valid JSON
+_UNPARSEABLE = object()
 
-def _get_weather_from_data(device_data: str | None) -> tuple[str, float]:
+def _parse_device_data(device_data: str | None) -> Any:
     """
-    Extract weather prediction from database sensor data
-    Returns: (weather_prediction, confidence_percentage)
+    Parse the device_data form field once per request.
+    Returns None when absent and _UNPARSEABLE when it is not valid JSON.
+    Not cached: orjson parses a snapshot in microseconds, and the only cache
+    on this path (_system_message_cache) keys on a digest, never the raw string.
     """
     if not device_data:
+        return None
+    try:
+        return orjson.loads(device_data)
+    except orjson.JSONDecodeError as e:
+        logger.warning("Could not parse device_data: %s", e)
+        return _UNPARSEABLE
+
+def _get_weather_from_data(data_list: Any) -> tuple[str, float]:
+    """
+    Extract weather prediction from parsed database sensor data
+    Returns: (weather_prediction, confidence_percentage)
+    """
+    if not isinstance(data_list, list) or not data_list:
         return "Unknown", 0.0
     
     try:
-        data_list = json.loads(device_data)
-        if not isinstance(data_list, list) or not data_list:
-            return "Unknown", 0.0
-        
         # Get weather prediction from first device that has it
         # (assuming all devices have the same weather prediction for the park)
         for device in data_list:
             if isinstance(device, dict):
                 if 'weather_prediction' in device and 'prediction_confidence' in device:
                     prediction = device['weather_prediction']
-                    confidence = float(device['prediction_confidence'])
+                    confidence = device['prediction_confidence']
+                    # orjson already yields floats for decimal values; only
+                    # ints and strings need the conversion
+                    if not isinstance(confidence, float):
+                        confidence = float(confidence)
                     return prediction, confidence
         
         # If no weather data found in any device
         return "Unknown", 0.0
         
     except Exception as e:
-        print(f"Error extracting weather data: {e}")
+        logger.warning("Error extracting weather data: %s", e)
         return "Unknown", 0.0
 
+# Verbal confidence per 10-point band: <50, 50s, 60s, 70s, 80s, >=90
+_CONF_EN = ("might be", "possibly", "probably", "likely", "very likely", "almost certainly")
+_CONF_IT = ("potrebbe essere", "forse", "abbastanza probabilmente", "probabilmente", "molto probabilmente", "quasi certamente")
+
 def _confidence_to_verbal(confidence: float, language: str = "en") -> str:
     """
     Convert confidence percentage to verbal expression
     """
-    if language == "it":
-        if confidence >= 90:
-            return "quasi certamente"
-        elif confidence >= 80:
-            return "molto probabilmente"
-        elif confidence >= 70:
-            return "probabilmente"
-        elif confidence >= 60:
-            return "abbastanza probabilmente"
-        elif confidence >= 50:
-            return "forse"
-        else:
-            return "potrebbe essere"
-    else:  # English
-        if confidence >= 90:
-            return "almost certainly"
-        elif confidence >= 80:
-            return "very likely"
-        elif confidence >= 70:
-            return "likely"
-        elif confidence >= 60:
-            return "probably"
-        elif confidence >= 50:
-            return "possibly"
-        else:
-            return "might be"
+    # Clamp to [40, 90] before indexing; constants go first so NaN clamps to 40
+    idx = int(min(90.0, max(40.0, confidence))) // 10 - 4
+    return (_CONF_IT if language == "it" else _CONF_EN)[idx]
+
+# Per-language labels for _format_sensor_reading, built once at import
+_LABELS_IT = {
+    "device": "Dispositivo",
+    "temp": "Temperatura",
+    "humidity": "Umidità",
+    "pressure": "Pressione",
+    "light": "Luce",
+    "noise": "Rumore",
+    "tof": "Distanza TOF",
+    "location": "Posizione",
+    "time": "Ora",
+    "weather": "Previsione Meteo",
+    "confidence": "Confidenza"
+}
+_LABELS_EN = {
+    "device": "Device",
+    "temp": "Temperature",
+    "humidity": "Humidity",
+    "pressure": "Pressure",
+    "light": "Light",
+    "noise": "Noise",
+    "tof": "TOF Distance",
+    "location": "Location",
+    "time": "Time",
+    "weather": "Weather Prediction",
+    "confidence": "Confidence"
+}
 
 def _format_sensor_reading(device: Dict[str, Any], language: str = "en") -> str:
     """Format a single sensor device reading into a readable string"""
     
     # Labels based on language
-    if language == "it":
-        labels = {
-            "device": "Dispositivo",
-            "temp": "Temperatura",
-            "humidity": "Umidità",
-            "pressure": "Pressione",
-            "light": "Luce",
-            "noise": "Rumore",
-            "tof": "Distanza TOF",
-            "location": "Posizione",
-            "time": "Ora",
-            "weather": "Previsione Meteo",
-            "confidence": "Confidenza"
-        }
-    else:
-        labels = {
-            "device": "Device",
-            "temp": "Temperature",
-            "humidity": "Humidity",
-            "pressure": "Pressure",
-            "light": "Light",
-            "noise": "Noise",
-            "tof": "TOF Distance",
-            "location": "Location",
-            "time": "Time",
-            "weather": "Weather Prediction",
-            "confidence": "Confidence"
-        }
+    labels = _LABELS_IT if language == "it" else _LABELS_EN
     
     parts = [f"{labels['device']} {device.get('device_id', 'Unknown')}:"]
     
@@ -239,31 +288,33 @@ def _format_sensor_reading(device: Dict[str, Any], language: str = "en") -> str:
     
     return "\n".join(parts)
 
-def _build_sensor_context(device_data: str | None, language: str = "en") -> str:
-    """Build sensor context from device data, return placeholder if missing"""
+_NO_DATA = {lang: prompts["no_data"] for lang, prompts in SYSTEM_PROMPTS.items()}
+
+def _build_sensor_context(data_list: Any, language: str = "en") -> str:
+    """Build sensor context from parsed device data, return placeholder if missing"""
+    # No snapshot at all is the common case during sensor outages
+    if data_list is None:
+        return _NO_DATA.get(language) or _NO_DATA["en"]
+
     lang_strings = SYSTEM_PROMPTS.get(language, SYSTEM_PROMPTS["en"])
     
-    if not device_data:
-        return lang_strings["no_data"]
-    
-    try:
-        data_list = json.loads(device_data)
-        if not isinstance(data_list, list):
-            return lang_strings["invalid_format"]
-    except Exception as e:
-        print(f"Warning: Could not parse device_data: {e}")
+    if data_list is _UNPARSEABLE:
         return lang_strings["parse_error"]
+    if not isinstance(data_list, list):
+        return lang_strings["invalid_format"]
 
     if not data_list:
         return lang_strings["no_readings"]
     
-    # Format each device reading
-    readings = [_format_sensor_reading(device, language) for device in data_list if isinstance(device, dict)]
+    # Format each device reading straight into one join
+    readings = "\n\n".join(
+        _format_sensor_reading(device, language) for device in data_list if isinstance(device, dict)
+    )
     
     if not readings:
         return lang_strings["no_readings"]
     
-    return lang_strings["data_header"] + "\n\n" + "\n\n".join(readings)
+    return lang_strings["data_header"] + "\n\n" + readings
 
 def _build_weather_context(weather_prediction: str, prediction_confidence: float, language: str = "en") -> str:
     """Build weather prediction context with verbal confidence"""
@@ -281,6 +332,63 @@ def _build_weather_context(weather_prediction: str, prediction_confidence: float
     
     return weather_text
 
+# Rendered system prompts keyed by (device_data digest, language), so repeated
+# polls with an unchanged snapshot skip formatting.
+# The digest keeps the multi-KB payloads themselves out of memory.
+# Only used from the event loop.
+_system_message_cache = LRUCache(maxsize=512)
+
+def build_system_message(device_data: str | None, data_list: Any, language: str, weather_prediction: str, prediction_confidence: float) -> str:
+    """Build (or reuse) the full system prompt for a sensor snapshot"""
+    digest = hashlib.blake2b(device_data.encode(), digest_size=16).digest() if device_data else b""
+    # Prediction and confidence are derived from device_data, so the digest
+    # already covers them; they may also be unhashable JSON values
+    key = (digest, language)
+    system_message = _system_message_cache.get(key)
+    if system_message is None:
+        pre, mid, post = PROMPT_PARTS.get(language, PROMPT_PARTS["en"])
+        system_message = "".join((
+            pre,
+            _build_sensor_context(data_list, language),
+            mid,
+            _build_weather_context(weather_prediction, prediction_confidence, language),
+            post,
+        ))
+        _system_message_cache[key] = system_message
+    return system_message
+
+async def _transcribe(audio: IO[bytes], ext: str, language: str) -> str:
+    """
+    Transcribe an audio file handle with Groq Whisper.
+    Returns the localized "unable to transcribe" message on failure.
+    """
+    errs = _ERRS[language]
+    try:
+        logger.debug("Transcribing audio with Groq Whisper (language: %s)", language)
+
+        # Transcribe using Groq Whisper with language setting; the SDK
+        # reads the file handle itself
+        async with _GROQ_SEM:
+            transcription = await groq_client.audio.transcriptions.create(
+                file=(f"recording.{ext}", audio),
+                model="whisper-large-v3-turbo",
+                language=language,
+                response_format="json",
+            )
+
+        transcript = transcription.text.strip()
+        logger.debug("Transcript: %s", transcript)
+
+        # If transcription is empty, note it
+        if not transcript:
+            transcript = errs["transcribe_failed"]
+            logger.warning("Empty transcription")
+        return transcript
+
+    except Exception as whisper_error:
+        logger.warning("Whisper transcription error: %s", whisper_error)
+        return errs["transcribe_failed"]
+
 @router.post("/chat")
 async def process_rag_request(
     user_query: str = Form(None),
@@ -290,153 +398,101 @@ async def process_rag_request(
 ):
     try:
         # Validate language parameter
-        if language not in ["en", "it"]:
+        if language not in _ERRS:
             language = "en"  # Default to English if invalid
+        errs = _ERRS[language]
         
         # Debug logging
-        print(f"\n=== Groq RAG Request ===")
-        print(f"language: {language}")
-        print(f"user_query: {user_query}")
-        print(f"device_data: {device_data[:200] if device_data else 'None'}...")
-        print(f"audio_file: {audio_file.filename if audio_file else 'None'}")
-        print(f"audio_type: {audio_file.content_type if audio_file else 'None'}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Groq RAG request: language=%s user_query=%s", language, user_query)
+            logger.debug("device_data=%s", device_data[:200] if device_data else None)
+            logger.debug(
+                "audio_file=%s audio_type=%s",
+                audio_file.filename if audio_file else None,
+                audio_file.content_type if audio_file else None,
+            )
         
         # Extract weather prediction from database sensor data
-        weather_prediction, prediction_confidence = _get_weather_from_data(device_data)
-        print(f"Weather prediction: {weather_prediction} (confidence: {prediction_confidence:.1f}%)")
-        
-        # Build context with full sensor data
-        context_str = _build_sensor_context(device_data, language)
-        weather_context_str = _build_weather_context(weather_prediction, prediction_confidence, language)
+        data_list = _parse_device_data(device_data)
+        weather_prediction, prediction_confidence = _get_weather_from_data(data_list)
+        logger.debug("Weather prediction: %s (confidence: %.1f%%)", weather_prediction, prediction_confidence)
 
         # Validate: need at least audio OR text query
         if not user_query and not audio_file:
-            error_msg = (
-                "Please provide either a text query or an audio recording." 
-                if language == "en" 
-                else "Si prega di fornire una query di testo o una registrazione audio."
-            )
-            raise HTTPException(status_code=400, detail=error_msg)
+            raise HTTPException(status_code=400, detail=errs["empty_query"])
 
         transcript = ""
+        system_message = None
         
         # Process audio if provided - use Groq Whisper for transcription
         if audio_file:
-            audio_bytes = await audio_file.read()
-            if not audio_bytes:
-                error_msg = (
-                    "Audio file is empty." 
-                    if language == "en" 
-                    else "Il file audio è vuoto."
-                )
-                raise HTTPException(status_code=400, detail=error_msg)
+            # Starlette has already spooled the upload; measure it in place and
+            # hand that same file to Whisper rather than copying it again, so an
+            # oversized upload is rejected without being written a second time
+            ext = _normalize_audio_mime(audio_file.content_type)
+            audio = audio_file.file
+            audio.seek(0, os.SEEK_END)
+            audio_size = audio.tell()
+            audio.seek(0)
+
+            if not audio_size:
+                raise HTTPException(status_code=400, detail=errs["audio_empty"])
 
             # Size check (Groq supports up to 25MB for Whisper)
-            if len(audio_bytes) > 25 * 1024 * 1024:
-                error_msg = (
-                    "Audio file too large (max 25MB). Please record a shorter message."
-                    if language == "en"
-                    else "File audio troppo grande (max 25MB). Si prega di registrare un messaggio più breve."
-                )
-                raise HTTPException(status_code=413, detail=error_msg)
-
-            print(f"Audio size: {len(audio_bytes)} bytes")
-            
+            if audio_size > 25 * 1024 * 1024:
+                raise HTTPException(status_code=413, detail=errs["audio_too_large"])
+
+            logger.debug("Audio size: %d bytes", audio_size)
+
+            # Start Whisper first and yield once so the request goes out; the
+            # prompt build then runs on the loop while the upload is in flight.
+            # The task must not outlive this request's audio file.
+            transcription_task = asyncio.create_task(_transcribe(audio, ext, language))
             try:
-                # Use Groq Whisper for transcription
-                import tempfile
-                
-                ext = _normalize_audio_mime(audio_file.content_type)
-                with tempfile.NamedTemporaryFile(suffix=f".{ext}", delete=False) as temp_audio:
-                    temp_audio.write(audio_bytes)
-                    temp_audio_path = temp_audio.name
-                
-                print(f"Transcribing audio with Groq Whisper (language: {language})...")
-                
-                # Transcribe using Groq Whisper with language setting
-                with open(temp_audio_path, "rb") as audio_file_handle:
-                    transcription = groq_client.audio.transcriptions.create(
-                        file=(f"recording.{ext}", audio_file_handle.read()),
-                        model="whisper-large-v3-turbo",
-                        language=language,
-                        response_format="json",
-                    )
-                
-                transcript = transcription.text.strip()
-                print(f"Transcript: {transcript}")
-                
-                # Clean up temp file
-                import os as os_module
-                try:
-                    os_module.unlink(temp_audio_path)
-                except:
-                    pass
-                
-                # If transcription is empty, note it
-                if not transcript:
-                    transcript = (
-                        "Unable to transcribe audio" 
-                        if language == "en" 
-                        else "Impossibile trascrivere l'audio"
-                    )
-                    print("Warning: Empty transcription")
-                    
-            except Exception as whisper_error:
-                print(f"Whisper transcription error: {whisper_error}")
-                transcript = (
-                    "Unable to transcribe audio" 
-                    if language == "en" 
-                    else "Impossibile trascrivere l'audio"
-                )
+                await asyncio.sleep(0)
+                system_message = build_system_message(device_data, data_list, language, weather_prediction, prediction_confidence)
+                transcript = await transcription_task
+            except BaseException:
+                transcription_task.cancel()
+                raise
 
         # Determine the actual query text
-        unable_to_transcribe = (
-            "Unable to transcribe audio" if language == "en" 
-            else "Impossibile trascrivere l'audio"
-        )
-        query_text = transcript if transcript and transcript != unable_to_transcribe else user_query
+        query_text = transcript if transcript and transcript != errs["transcribe_failed"] else user_query
         
         if not query_text:
-            error_response = (
-                "I couldn't understand the audio. Could you please try again or type your question?"
-                if language == "en"
-                else "Non ho capito l'audio. Potresti riprovare o scrivere la tua domanda?"
-            )
             return {
                 "transcript": transcript,
-                "answer": error_response,
+                "answer": errs["not_understood"],
                 "weather_prediction": weather_prediction,
                 "prediction_confidence": prediction_confidence
             }
 
-        # Get language-specific system prompt
-        lang_prompts = SYSTEM_PROMPTS.get(language, SYSTEM_PROMPTS["en"])
-        system_message = lang_prompts["system_template"].format(
-            context=context_str,
-            weather_context=weather_context_str
-        )
+        # Get language-specific system prompt with full sensor data
+        if system_message is None:
+            system_message = build_system_message(device_data, data_list, language, weather_prediction, prediction_confidence)
 
         # Call Groq Chat Completion
-        print(f"Calling Groq chat completion with query: {query_text[:100]}...")
+        logger.debug("Calling Groq chat completion with query: %.100s", query_text)
         
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_message
-                },
-                {
-                    "role": "user",
-                    "content": query_text
-                }
-            ],
-            model="llama-3.3-70b-versatile",  # Fast and capable model
-            temperature=0.3,
-            max_tokens=500,
-        )
+        async with _GROQ_SEM:
+            chat_completion = await groq_client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system_message
+                    },
+                    {
+                        "role": "user",
+                        "content": query_text
+                    }
+                ],
+                model="llama-3.3-70b-versatile",  # Fast and capable model
+                temperature=0.3,
+                max_tokens=500,
+            )
 
         answer = chat_completion.choices[0].message.content.strip()
-        print(f"Groq response received: {answer[:200]}...")
+        logger.debug("Groq response received: %.200s", answer)
 
         # Return structured response with weather prediction
         return {
@@ -449,14 +505,7 @@ async def process_rag_request(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"\n=== ERROR ===")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error message: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Groq RAG request failed: %s: %s", type(e).__name__, e)
         
-        error_detail = (
-            f"Server error: {str(e)}"
-            if language == "en"
-            else f"Errore del server: {str(e)}"
-        )
+        error_detail = _ERRS.get(language, _ERRS["en"])["server_error"] + str(e)
         raise HTTPException(status_code=500, detail=error_detail)
\ No newline at end of file
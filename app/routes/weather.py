@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import typing
+import orjson
+from fastapi import APIRouter, Depends, Query, Response
 from typing import List, Dict, Any
 from app.schemas import WeatherPoint
 from app.influx import query as influx_query
@@ -6,37 +9,61 @@ from app.config import INFLUXDB_BUCKET, INFLUXDB_Measurement as meas
 from app.auth import get_current_user
 
 router = APIRouter(prefix="")
-@router.get("/forecast/", response_model=List[WeatherPoint])
-def get_weather_forecast(
-    # device_id: str,
-    minutes: int = Query(60, ge=1, le=7*24*60),
-    current_user: str = Depends(get_current_user),  
-    measurement: str = Query(meas),):
-    # Flux query: filter by time range, measurement, and device_id tag
+
+# WeatherPoint field -> declared type, used to shape rows without building a
+# model per record. "time" comes from record.get_time() instead.
+_FIELD_TYPES = tuple(
+    (name, typing.get_args(field.annotation)[0])
+    for name, field in WeatherPoint.model_fields.items()
+    if name != "time"
+)
+
+async def _forecast(minutes: int, measurement: str) -> List[Dict[str, Any]]:
+    # Flux query: filter by time range, measurement, and device_id tag.
+    # pivot() turns the "tall" (time, field, value) records into "wide" rows
+    # server-side: one record per time with a column per field. It drops
+    # _field from the group key, so the per-field tables merge into one wide
+    # table on its own; a group() before it would fail on this measurement,
+    # whose _value is float for sensors but string for weather_prediction.
     flux = f'''
 from(bucket: "{INFLUXDB_BUCKET}")
   |> range(start: -{minutes}m)
   |> filter(fn: (r) => r._measurement == "{measurement}")
   |> keep(columns: ["_time","_field","_value"])
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> sort(columns: ["_time"])
 '''
 
-    tables = influx_query(flux)
-
-    # Influx results are "tall": each record is (time, field, value).
-    # We reshape into "wide" JSON: one object per time with multiple fields.
-    by_time: Dict[str, Dict[str, Any]] = {}
+    # The Influx client is blocking; keep it off the event loop
+    tables = await asyncio.to_thread(influx_query, flux)
 
+    # Rows arrive already merged and sorted by time ascending. Each one is
+    # shaped like WeatherPoint: every field present (null when missing),
+    # values cast to the declared type, and unknown columns left out.
+    rows = []
     for table in tables:
         for record in table.records:
-            t = record.get_time().isoformat()
-            field = record.get_field()
-            value = record.get_value()
+            values = record.values
+            row = {"time": record.get_time()}
+            for name, typ in _FIELD_TYPES:
+                v = values.get(name)
+                row[name] = v if v is None or type(v) is typ else typ(v)
+            rows.append(row)
+    return rows
 
-            if t not in by_time:
-                by_time[t] = {"time": record.get_time()}
-            by_time[t][field] = value
 
-    # Convert dict->list, sort by time ascending
-    result = list(by_time.values())
-    result.sort(key=lambda x: x["time"])
-    return result
+# Rows are already shaped like WeatherPoint, so skip per-item validation and
+# let orjson encode them; the model stays in the OpenAPI docs via `responses`.
+@router.get(
+    "/forecast/",
+    response_model=None,
+    responses={200: {"model": List[WeatherPoint]}},
+)
+async def get_weather_forecast(
+    # device_id: str,
+    minutes: int = Query(60, ge=1, le=7*24*60),
+    current_user: str = Depends(get_current_user),  
+    measurement: str = Query(meas),):
+    rows = await _forecast(minutes, measurement)
+    # OPT_UTC_Z keeps the "...Z" timestamps Pydantic produced before
+    return Response(orjson.dumps(rows, option=orjson.OPT_UTC_Z), media_type="application/json")
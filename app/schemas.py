@@ -1,24 +1,26 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from typing import Optional
 
 class WeatherPoint(BaseModel):
-    time: Optional[datetime] = None
-    device_id: Optional[int] = None
-    temperature: Optional[float] = None
-    humidity: Optional[float] = None
-    pressure: Optional[float] = None
-    light: Optional[float] = None
-    noise: Optional[float] = None
-    tof: Optional[float] = None
-    angle: Optional[float] = None
-    accX: Optional[float] = None
-    accY: Optional[float] = None
-    accZ: Optional[float] = None
-    vibrAccX: Optional[float] = None
-    vibrAccY: Optional[float] = None
-    vibrAccZ: Optional[float] = None
-    weather_prediction: Optional[str] = None
-    prediction_confidence: Optional[float] = None
-    latitude:Optional[float]=None
-    longitude:Optional[float]=None
+    # Influx rows may carry fields from newer sensors; drop them quietly
+    model_config = ConfigDict(extra="ignore")
+
+    time: datetime | None = None
+    device_id: int | None = None
+    temperature: float | None = None
+    humidity: float | None = None
+    pressure: float | None = None
+    light: float | None = None
+    noise: float | None = None
+    tof: float | None = None
+    angle: float | None = None
+    accX: float | None = None
+    accY: float | None = None
+    accZ: float | None = None
+    vibrAccX: float | None = None
+    vibrAccY: float | None = None
+    vibrAccZ: float | None = None
+    weather_prediction: str | None = None
+    prediction_confidence: float | None = None
+    latitude: float | None = None
+    longitude: float | None = None